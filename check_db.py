@@ -1,20 +1,26 @@
+import csv
 import sqlite3
-import pandas as pd
+import sys
 
 DB_PATH = "crypto_data.db"
 
+
+def print_rows(cursor, limit):
+    writer = csv.writer(sys.stdout)
+    writer.writerow([col[0] for col in cursor.description])
+    writer.writerows(cursor.fetchmany(limit))
+
+
 # Connect to the database
 conn = sqlite3.connect(DB_PATH)
 
 # --- Check historical snapshots ---
 print("📊 Latest historical snapshots:")
-snapshots_df = pd.read_sql("SELECT * FROM crypto_snapshots ORDER BY ROWID DESC LIMIT 10", conn)
-print(snapshots_df)
+print_rows(conn.execute("SELECT * FROM crypto_snapshots ORDER BY ROWID DESC LIMIT 10"), 10)
 
 # --- Check GPT sentiment ---
 print("\n🤖 Latest stored GPT sentiment:")
-sentiment_df = pd.read_sql("SELECT * FROM crypto_sentiments ORDER BY id DESC LIMIT 5", conn)
-print(sentiment_df)
+print_rows(conn.execute("SELECT * FROM crypto_sentiments ORDER BY id DESC LIMIT 5"), 5)
 
 # Close connection
 conn.close()
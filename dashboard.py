@@ -6,13 +6,13 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import fetch_and_analyze as fa
-from sentiment_rss import fetch_crypto_news, analyze_sentiment_batch as analyze_sentiment
-from openai import OpenAI
+from sentiment_rss import fetch_crypto_news, analyze_sentiment_batch
 from io import BytesIO
 import altair as alt
-import datetime
 from dotenv import load_dotenv
 import json
+import threading
+from contextlib import contextmanager
 
 load_dotenv()
 
@@ -20,7 +20,174 @@ load_dotenv()
 # 🔧 CONFIG
 # =========================================================
 DB_PATH = "crypto_data.db"
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+HISTORY_LIMIT = 5000  # newest raw snapshots shown in Tab 2 (exports carry the full table)
+LEGACY_PRICE_COLS = ["Price", "💰 Price (USD)"]  # "$1,234.56" TEXT in older databases
+
+
+@st.cache_resource
+def get_openai_client():
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@st.cache_resource
+def get_conn():
+    """One long-lived SQLite connection per server process, configured once and never closed.
+
+    Autocommit mode (``isolation_level=None``): multi-statement writes go through
+    ``transaction()`` so each refresh still commits exactly once.
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=5000;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-40000;
+        PRAGMA mmap_size=268435456;
+        """
+    )
+    _ensure_schema(conn)
+    return conn
+
+
+@st.cache_resource
+def get_db_lock():
+    """Guards the shared connection: every session runs on its own thread.
+
+    Reentrant so a read helper can run inside ``transaction()``.
+    """
+    return threading.RLock()
+
+
+@contextmanager
+def transaction(conn):
+    """Explicit write transaction; IMMEDIATE takes the write lock up front (no mid-way busy upgrade).
+
+    Holds ``get_db_lock()`` throughout, so no other session's statements interleave.
+    """
+    with get_db_lock():
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            # Also covers Streamlit's StopException/RerunException, which bypass Exception
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _ensure_schema(conn):
+    """Create the dashboard's tables/indexes once per process (via ``get_conn``).
+
+    Older crypto_snapshots stored prices/changes as formatted TEXT and are migrated here;
+    crypto_news belongs to sentiment_rss, which sets it up when it is imported.
+    """
+    with transaction(conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crypto_snapshots (
+                Name TEXT,
+                Symbol TEXT,
+                price_usd REAL,
+                change_1h_pct REAL,
+                change_24h_pct REAL,
+                change_7d_pct REAL,
+                change_14d_pct REAL,
+                change_30d_pct REAL,
+                timestamp TIMESTAMP
+            )
+            """
+        )
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(crypto_snapshots)")}
+        if "price_usd" not in existing:
+            conn.execute("ALTER TABLE crypto_snapshots ADD COLUMN price_usd REAL")
+        for legacy in LEGACY_PRICE_COLS:
+            if legacy in existing:
+                conn.execute(
+                    f"""
+                    UPDATE crypto_snapshots
+                    SET price_usd = CAST(REPLACE(REPLACE("{legacy}", '$', ''), ',', '') AS REAL)
+                    WHERE price_usd IS NULL AND "{legacy}" IS NOT NULL AND "{legacy}" != 'N/A'
+                    """
+                )
+        for raw_col, label in fa.CHANGE_LABELS.items():
+            if raw_col not in existing:
+                conn.execute(f"ALTER TABLE crypto_snapshots ADD COLUMN {raw_col} REAL")
+            if label in existing:
+                # One-off backfill of legacy rows so the history stays plottable
+                conn.execute(
+                    f"""
+                    UPDATE crypto_snapshots
+                    SET {raw_col} = CAST(REPLACE("{label}", '%', '') AS REAL)
+                    WHERE {raw_col} IS NULL AND "{label}" IS NOT NULL AND "{label}" != 'N/A'
+                    """
+                )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_snap_name_ts ON crypto_snapshots(Name, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_snap_ts ON crypto_snapshots(timestamp)")
+
+        # Coin dimension table so the multiselect never scans the history
+        conn.execute("CREATE TABLE IF NOT EXISTS coins (name TEXT PRIMARY KEY)")
+        if conn.execute("SELECT 1 FROM coins LIMIT 1").fetchone() is None:
+            conn.execute("INSERT OR IGNORE INTO coins (name) SELECT DISTINCT Name FROM crypto_snapshots")
+
+        # Hourly rollup feeding the trend chart (bounded by buckets × coins)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS snapshots_hourly (
+                Name TEXT,
+                bucket TEXT,
+                price_avg REAL,
+                change_1h_pct REAL,
+                change_24h_pct REAL,
+                change_7d_pct REAL,
+                change_14d_pct REAL,
+                change_30d_pct REAL,
+                PRIMARY KEY (Name, bucket)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_bucket ON snapshots_hourly(bucket)")
+        if conn.execute("SELECT 1 FROM snapshots_hourly LIMIT 1").fetchone() is None:
+            refresh_hourly_rollup(conn)
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crypto_sentiments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                sentiment TEXT
+            )
+            """
+        )
+
+
+def refresh_hourly_rollup(conn, since=None):
+    """Recompute hourly averages, limited to the buckets at or after ``since`` when given."""
+    where, params = "", ()
+    if since is not None:
+        where = "WHERE timestamp >= strftime('%Y-%m-%d %H:00', ?)"
+        params = (str(since),)
+    conn.execute(
+        f"""
+        INSERT OR REPLACE INTO snapshots_hourly
+        SELECT
+            Name,
+            strftime('%Y-%m-%d %H:00', timestamp) AS bucket,
+            AVG(price_usd),
+            AVG(change_1h_pct),
+            AVG(change_24h_pct),
+            AVG(change_7d_pct),
+            AVG(change_14d_pct),
+            AVG(change_30d_pct)
+        FROM crypto_snapshots
+        {where}
+        GROUP BY Name, bucket
+        """,
+        params,
+    )
 
 st.set_page_config(page_title="💹 Crypto Analyst Agent Dashboard", layout="wide")
 st.title("💹 Crypto Analyst Agent Dashboard")
@@ -31,32 +198,28 @@ st.caption("Empower your investment strategy with real-time analytics and histor
 # =========================================================
 def generate_gpt_market_summary(df):
     try:
-        available_cols = [c for c in ["Name", "📉 24h Change", "Price"] if c in df.columns]
+        available_cols = [c for c in ["Name", "change_24h_pct", "price_usd"] if c in df.columns]
         if not available_cols:
             raise ValueError("Required columns not found in DataFrame.")
 
-        data_preview = df[available_cols].head(10).to_string(index=False)
-
-        prompt = f"""
-        You are a seasoned crypto market analyst.
-        Analyze the following crypto data and produce a short, clear professional summary (3–5 sentences):
-        - Mention general market trend.
-        - Identify top gainers and losers.
-        - Reference key coins (Bitcoin, Ethereum, etc.).
-        - Include macro sentiment or investor tone if implied.
+        # Compact CSV instead of the space-padded to_string() table → fewer prompt tokens
+        data_preview = df[available_cols].head(10).to_csv(index=False)
 
-        Here is the data:
-        {data_preview}
-        """
+        prompt = (
+            "Summarize this crypto data in 3–5 professional sentences: overall trend, "
+            "top gainers/losers, key coins (BTC, ETH, ...), and implied investor tone.\n"
+            f"{data_preview}"
+        )
 
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": "You are a professional crypto market analyst."},
+                {"role": "system", "content": "You are a crypto market analyst."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.6,
-            max_tokens=200
+            max_tokens=200,
+            response_format={"type": "text"},
         )
 
         return response.choices[0].message.content.strip()
@@ -64,6 +227,232 @@ def generate_gpt_market_summary(df):
     except Exception as e:
         return f"⚠️ GPT summary generation failed: {e}"
 
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_market_summary(df_key, _df):
+    """One GPT call per distinct snapshot; ``_df`` is excluded from hashing, ``df_key`` identifies it."""
+    return generate_gpt_market_summary(_df)
+
+
+@st.cache_data(ttl=900, show_spinner=False)
+def summarize_headlines(headlines: tuple) -> str:
+    """3-sentence overview of the given headlines; a tuple so identical batches hit the cache."""
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a crypto news analyst."},
+            {
+                "role": "user",
+                "content": "Summarize the following crypto news headlines into a concise 3-sentence market overview:\n"
+                + "\n".join(headlines),
+            },
+        ],
+        temperature=0.6,
+        max_tokens=150,
+    )
+    return response.choices[0].message.content.strip()
+
+@st.cache_data(ttl=900, show_spinner=False)
+def score_and_store_headlines(headlines: tuple) -> list:
+    """Score ``(title, link)`` pairs in one batched GPT call and upsert the results.
+
+    Cached on the tuple: fetch_crypto_news hands back the same rows for 10 minutes,
+    so reruns within that window neither call OpenAI nor open a write transaction.
+    """
+    sentiments = analyze_sentiment_batch([title for title, _ in headlines])
+    # ✅ ALWAYS store JSON text — never raw lists/dicts
+    news_rows = [
+        (title, link, json.dumps(sentiment, ensure_ascii=False))
+        for (title, link), sentiment in zip(headlines, sentiments)
+    ]
+    # The GPT call stays outside the write lock; the upserts commit once.
+    # Articles already stored by fetch_crypto_news get their sentiment filled in
+    # (unique link index) instead of being inserted a second time.
+    conn = get_conn()
+    with transaction(conn):
+        conn.executemany(
+            """
+            INSERT INTO crypto_news (title, link, sentiment) VALUES (?, ?, ?)
+            ON CONFLICT(link) DO UPDATE SET sentiment = excluded.sentiment
+            """,
+            news_rows,
+        )
+    return sentiments
+
+# =========================================================
+# 📡 Live Data Fetch
+# =========================================================
+def load_live_data():
+    """Memoized CoinGecko frame (see fa.fetch_crypto_data) with categorical coin labels."""
+    df = fa.fetch_crypto_data()
+    if df is not None and not df.empty:
+        for col in ("Name", "Symbol"):
+            df[col] = df[col].astype("category")
+    return df
+
+
+SNAPSHOT_COLUMNS = ["Name", "Symbol", "price_usd", *fa.CHANGE_LABELS, "timestamp"]
+
+
+def _ts_text(ts):
+    """Timestamps are stored as 'YYYY-MM-DD HH:MM:SS.ffffff' text."""
+    return str(pd.Timestamp(ts).to_pydatetime())
+
+
+def snapshot_stored(conn, ts):
+    """True when a snapshot with this timestamp was already appended (cached fetch reused)."""
+    with get_db_lock():
+        row = conn.execute(
+            "SELECT 1 FROM crypto_snapshots WHERE timestamp = ? LIMIT 1",
+            (_ts_text(ts),),
+        ).fetchone()
+    return row is not None
+
+
+def insert_snapshots(conn, df):
+    """Append the live frame with one executemany (caller owns the transaction)."""
+    cols = ", ".join(SNAPSHOT_COLUMNS)
+    placeholders = ", ".join("?" * len(SNAPSHOT_COLUMNS))
+    # Bind-ready rows straight from the object array (no per-row tuple rebuilding)
+    rows = (
+        df[SNAPSHOT_COLUMNS]
+        .assign(timestamp=df["timestamp"].map(_ts_text))
+        .to_numpy(dtype=object)
+        .tolist()
+    )
+    conn.executemany(f"INSERT INTO crypto_snapshots ({cols}) VALUES ({placeholders})", rows)
+
+# =========================================================
+# 🎨 Live Table Display Helper
+# =========================================================
+# Native column formatting instead of a pandas Styler (no per-cell HTML/CSS)
+LIVE_COLUMN_CONFIG = {
+    "price_usd": st.column_config.NumberColumn("Price", format="dollar"),
+    **{
+        raw_col: st.column_config.NumberColumn(label, format="%+.2f%%")
+        for raw_col, label in fa.CHANGE_LABELS.items()
+    },
+}
+
+
+def mark_gainer_loser(df, gainer_idx, loser_idx):
+    """Flag the top gainer / biggest loser by prefixing their Name cell."""
+    view = df.copy()
+    view["Name"] = view["Name"].astype(str)
+    if pd.notna(gainer_idx):
+        view.loc[gainer_idx, "Name"] = "🏆 " + view.loc[gainer_idx, "Name"]
+    if pd.notna(loser_idx):
+        view.loc[loser_idx, "Name"] = "📉 " + view.loc[loser_idx, "Name"]
+    return view
+
+# =========================================================
+# 🗄️ Historical Data Loaders
+# =========================================================
+def snapshot_count():
+    """Cheap cache key: the history only changes when new snapshots are appended.
+
+    crypto_snapshots is append-only, so MAX(rowid) equals the row count but is a
+    single b-tree seek, whereas COUNT(*) walks a whole index on every rerun.
+    """
+    conn = get_conn()
+    with get_db_lock():
+        return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM crypto_snapshots").fetchone()[0]
+
+
+@st.cache_data(ttl=60)
+def load_history(row_count: int) -> pd.DataFrame:
+    conn = get_conn()
+    with get_db_lock():
+        hist_df = pd.read_sql(
+            "SELECT * FROM crypto_snapshots ORDER BY timestamp DESC LIMIT ?",
+            conn,
+            params=(HISTORY_LIMIT,),
+        )
+    return _tidy_history(hist_df)
+
+
+def load_full_history() -> pd.DataFrame:
+    """Every snapshot, oldest first — export only, so it is read on demand and not cached."""
+    conn = get_conn()
+    with get_db_lock():
+        hist_df = pd.read_sql("SELECT * FROM crypto_snapshots ORDER BY rowid", conn)
+    return _tidy_history(hist_df)
+
+
+def _tidy_history(hist_df: pd.DataFrame) -> pd.DataFrame:
+    # Legacy "$x"/"x%" TEXT columns are superseded by the backfilled REAL columns
+    legacy_cols = [*LEGACY_PRICE_COLS, "Market Cap", "Volume (24h)", *fa.CHANGE_LABELS.values()]
+    drop_cols = [c for c in legacy_cols if c in hist_df.columns]
+    hist_df = hist_df.drop(columns=drop_cols, errors="ignore")
+    for col in ("Name", "Symbol"):
+        if col in hist_df.columns:
+            hist_df[col] = hist_df[col].astype("category")
+    return hist_df
+
+
+@st.cache_data(ttl=60)
+def load_trend(row_count: int, coins: tuple, col_name: str) -> pd.DataFrame:
+    """Last 7 days of hourly buckets for the selected coins, projected to one change column
+    and numbered with a 1-based ``Snapshot`` column for the chart's default x axis.
+
+    The window is anchored on the newest bucket so stale databases still chart;
+    ``col_name`` always comes from the fixed timeframe map, never from user text.
+    """
+    if not coins:
+        return pd.DataFrame(columns=["Name", "timestamp", col_name, "Snapshot"])
+    placeholders = ",".join("?" * len(coins))
+    conn = get_conn()
+    with get_db_lock():
+        trend_df = pd.read_sql(
+            f"""
+            SELECT Name, bucket AS timestamp, {col_name}
+            FROM snapshots_hourly
+            WHERE Name IN ({placeholders})
+              AND bucket > (SELECT datetime(MAX(bucket), '-7 days') FROM snapshots_hourly)
+            ORDER BY bucket, Name
+            """,
+            conn,
+            params=list(coins),
+        )
+    trend_df["Name"] = trend_df["Name"].astype("category")
+    trend_df["Snapshot"] = range(1, len(trend_df) + 1)
+    return trend_df
+
+
+@st.cache_data(ttl=60)
+def coin_list(row_count: int) -> list:
+    conn = get_conn()
+    with get_db_lock():
+        return [r[0] for r in conn.execute("SELECT name FROM coins ORDER BY rowid").fetchall()]
+
+# =========================================================
+# 💾 Export Helpers (cached per history row count)
+# =========================================================
+@st.cache_data(show_spinner=False)
+def build_csv(row_count: int) -> bytes:
+    return load_full_history().to_csv(index=False).encode("utf-8")
+
+
+@st.cache_data(show_spinner=False)
+def build_excel(row_count: int) -> bytes:
+    """Stream rows with xlsxwriter's constant_memory mode.
+
+    pandas' ExcelWriter emits cells column by column, which constant_memory
+    (row-flushing) silently drops, so rows are written directly instead.
+    """
+    import xlsxwriter  # only needed once someone exports
+
+    _df = load_full_history()
+    buf = BytesIO()
+    workbook = xlsxwriter.Workbook(buf, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("Snapshots")
+    worksheet.write_row(0, 0, [str(c) for c in _df.columns])
+    values = _df.astype(object).where(_df.notna(), None)
+    for r, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(r, 0, row)
+    workbook.close()
+    return buf.getvalue()
+
 # =========================================================
 # 🧩 TABS
 # =========================================================
@@ -80,67 +469,41 @@ with tab1:
             st.cache_data.clear()
             st.success("✅ Live data refreshed successfully!")
 
-        df = fa.fetch_crypto_data(force_refresh=refresh)
+        df = load_live_data()
 
         if df is not None and not df.empty:
-            conn = sqlite3.connect(DB_PATH)
-            df.to_sql("crypto_snapshots", conn, if_exists="append", index=False)
-            conn.close()
+            has_24h = df["change_24h_pct"].notna().any()
+            gainer_idx = df["change_24h_pct"].idxmax() if has_24h else None
+            loser_idx = df["change_24h_pct"].idxmin() if has_24h else None
 
-            df_clean = df.copy()
-            df_clean["24h_val"] = pd.to_numeric(
-                df_clean["📉 24h Change"].str.replace("%", ""), errors="coerce"
+            st.dataframe(
+                mark_gainer_loser(df, gainer_idx, loser_idx),
+                column_config=LIVE_COLUMN_CONFIG,
             )
-            gainer_idx = df_clean["24h_val"].idxmax() if not df_clean.empty else None
-            loser_idx = df_clean["24h_val"].idxmin() if not df_clean.empty else None
-
-            def highlight_gainers_losers(row):
-                style = [""] * len(row)
-                for i, col in enumerate(row.index):
-                    if col in [
-                        "📈 1h Change",
-                        "📉 24h Change",
-                        "📆 7d Change",
-                        "📆 14d Change",
-                        "📆 30d Change",
-                    ]:
-                        val = row[col]
-                        if val != "N/A":
-                            try:
-                                f = float(val.replace("%", ""))
-                                style[i] = "color: green" if f > 0 else "color: red"
-                            except:
-                                style[i] = ""
-                    if row.name == gainer_idx:
-                        style[i] += "; background-color: #d4edda"
-                    if row.name == loser_idx:
-                        style[i] += "; background-color: #f8d7da"
-                return style
-
-            st.dataframe(df.style.apply(highlight_gainers_losers, axis=1))
 
             st.markdown("---")
             st.subheader("🤖 Market Insights")
-            gpt_summary = generate_gpt_market_summary(df)
+            snapshot_ts = df["timestamp"].max()
+            gpt_summary = cached_market_summary((str(snapshot_ts), len(df)), df)
             st.markdown(gpt_summary)
 
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS crypto_sentiments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    sentiment TEXT
-                )
-                """
-            )
-            cursor.execute(
-                "INSERT INTO crypto_sentiments (sentiment) VALUES (?)",
-                (gpt_summary,),
-            )
-            conn.commit()
-            conn.close()
+            # ✅ Snapshot + insight land in a single transaction (one commit per rerun),
+            #    skipped entirely when the cached fetch hands back an already-stored frame
+            conn = get_conn()
+            if not snapshot_stored(conn, snapshot_ts):
+                with transaction(conn):
+                    # Re-checked under the lock: another session may have stored it meanwhile
+                    if not snapshot_stored(conn, snapshot_ts):
+                        insert_snapshots(conn, df)
+                        refresh_hourly_rollup(conn, since=df["timestamp"].min())
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO coins (name) VALUES (?)",
+                            [(name,) for name in df["Name"].unique()],
+                        )
+                        conn.execute(
+                            "INSERT INTO crypto_sentiments (sentiment) VALUES (?)",
+                            (gpt_summary,),
+                        )
 
             # --- NEWS & SENTIMENT ---
             st.markdown("---")
@@ -152,56 +515,19 @@ with tab1:
                 if news_df.empty:
                     st.info("⚠️ No news articles fetched.")
                 else:
-                    conn = sqlite3.connect(DB_PATH)
-                    cursor = conn.cursor()
-
-                    cursor.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS crypto_news (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            title TEXT,
-                            link TEXT,
-                            sentiment TEXT,
-                            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                        )
-                        """
-                    )
-                    conn.commit()
-
-                    # ✅ ALWAYS store JSON text — never raw lists/dicts
-                    for _, row in news_df.head(10).iterrows():
-                        sentiment = analyze_sentiment(str(row.get("content", "")))
-                        sentiment_text = json.dumps(sentiment, ensure_ascii=False)
-
-                        cursor.execute(
-                            "INSERT INTO crypto_news (title, link, sentiment) VALUES (?, ?, ?)",
-                            (row["title"], row["link"], sentiment_text),
-                        )
-
-                    conn.commit()
-                    conn.close()
+                    top_news = news_df.head(10).to_dict("records")
+                    headlines = tuple((r["title"], r["link"]) for r in top_news)
+                    # ✅ Scored + stored once per headline set, not on every widget rerun
+                    score_and_store_headlines(headlines)
+                    md_lines = [f"- [{title}]({link})" for title, link in headlines]
 
-                    for _, row in news_df.head(10).iterrows():
-                        st.markdown(f"- [{row['title']}]({row['link']})")
+                    st.markdown("\n".join(md_lines))
 
                     st.markdown("---")
                     st.subheader("🧭 News Summary")
 
                     try:
-                        headlines = "\n".join(news_df["title"].head(10).tolist())
-                        response = client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=[
-                                {"role": "system", "content": "You are a crypto news analyst."},
-                                {
-                                    "role": "user",
-                                    "content": f"Summarize the following crypto news headlines into a concise 3-sentence market overview:\n{headlines}",
-                                },
-                            ],
-                            temperature=0.6,
-                            max_tokens=150,
-                        )
-                        summary = response.choices[0].message.content.strip()
+                        summary = summarize_headlines(tuple(title for title, _ in headlines))
                         st.write(summary)
 
                     except Exception as e:
@@ -221,13 +547,8 @@ with tab1:
 # =========================================================
 with tab2:
     try:
-        conn = sqlite3.connect(DB_PATH)
-        hist_df = pd.read_sql("SELECT * FROM crypto_snapshots", conn)
-        conn.close()
-
-        if not hist_df.empty:
-            drop_cols = [c for c in ["Price", "Market Cap", "Volume (24h)"] if c in hist_df.columns]
-            hist_df.drop(columns=drop_cols, inplace=True, errors="ignore")
+        row_count = snapshot_count()
+        hist_df = load_history(row_count)
 
     except Exception as e:
         st.error(f"❌ Database Error: {e}")
@@ -241,18 +562,19 @@ with tab2:
 
         st.subheader("📈 Multi-Coin Trend Chart")
 
+        coin_names = coin_list(row_count)
         coins = st.multiselect(
             "Select Coins",
-            hist_df["Name"].unique().tolist(),
-            default=hist_df["Name"].unique().tolist(),
+            coin_names,
+            default=coin_names,
         )
 
         timeframe_map = {
-            "1h": "📈 1h Change",
-            "24h": "📉 24h Change",
-            "7d": "📆 7d Change",
-            "14d": "📆 14d Change",
-            "30d": "📆 30d Change",
+            "1h": "change_1h_pct",
+            "24h": "change_24h_pct",
+            "7d": "change_7d_pct",
+            "14d": "change_14d_pct",
+            "30d": "change_30d_pct",
         }
 
         selected_timeframe = st.selectbox("Select Timeframe", list(timeframe_map.keys()))
@@ -260,11 +582,9 @@ with tab2:
 
         use_timestamp = st.toggle("Use Actual Timestamp (instead of Snapshot #)", value=False)
 
-        plot_df = hist_df[hist_df["Name"].isin(coins)].copy()
-        plot_df[col_name] = (
-            plot_df[col_name].astype(str).str.replace("%", "", regex=False).astype(float)
-        )
-        plot_df["Snapshot"] = range(1, len(plot_df) + 1)
+        # Filter, projection and Snapshot numbering all happen inside the cached loader,
+        # so a rerender with unchanged inputs does no DataFrame work at all
+        plot_df = load_trend(row_count, tuple(coins), col_name)
 
         if use_timestamp and "timestamp" in plot_df.columns:
             x_field = alt.X("timestamp:T", title="Timestamp")
@@ -295,20 +615,17 @@ with tab2:
         st.markdown("---")
         st.subheader("💾 Export Historical Data")
 
-        csv = hist_df.to_csv(index=False).encode("utf-8")
+        # Callables defer building the bytes until the button is actually clicked
         st.download_button(
             "⬇️ Download CSV",
-            data=csv,
+            data=lambda: build_csv(row_count),
             file_name="crypto_history.csv",
             mime="text/csv",
         )
 
-        excel_buffer = BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-            hist_df.to_excel(writer, index=False, sheet_name="Snapshots")
         st.download_button(
             "⬇️ Download Excel",
-            data=excel_buffer.getvalue(),
+            data=lambda: build_excel(row_count),
             file_name="crypto_history.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
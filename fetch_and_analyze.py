@@ -1,10 +1,10 @@
 import os
-import time
-import json
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-import streamlit as st  # ✅ added for cache control integration with dashboard
+import streamlit as st  # ✅ st.cache_data replaces the old JSON file cache
 
 # =========================================================
 # 🔧 CONFIG
@@ -13,8 +13,17 @@ load_dotenv()
 
 API_KEY = os.getenv("COINGECKO_API_KEY")  # optional
 API_URL = "https://api.coingecko.com/api/v3/coins/markets"
-CACHE_FILE = "crypto_cache.json"
-CACHE_TTL = 300  # 5 minutes cache to respect rate limits
+CACHE_TTL = 300  # 5 minutes in-memory cache to respect rate limits
+
+# Shared session: keeps the TCP/TLS connection to CoinGecko alive between fetches.
+# Retries (429 / 5xx) back off exponentially, honour Retry-After and reuse the connection.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(max_retries=Retry(
+    total=3,
+    backoff_factor=2,
+    status_forcelist=[429, 500, 502, 503, 504],
+    respect_retry_after_header=True,
+)))
 
 COINS = [
     ("bitcoin", "BTC"),
@@ -29,11 +38,26 @@ COINS = [
     ("tron", "TRX"),
 ]
 
+# Raw % change columns (stored as REAL) → labels used on the live table
+CHANGE_LABELS = {
+    "change_1h_pct": "📈 1h Change",
+    "change_24h_pct": "📉 24h Change",
+    "change_7d_pct": "📆 7d Change",
+    "change_14d_pct": "📆 14d Change",
+    "change_30d_pct": "📆 30d Change",
+}
+
 # =========================================================
 # 🧮 HELPERS
 # =========================================================
+def safe_usd(value):
+    if value is None or pd.isna(value):
+        return "N/A"
+    return f"${value:,.2f}"
+
+
 def safe_pct(value):
-    if value is None:
+    if value is None or pd.isna(value):
         return "N/A"
     try:
         return f"{value:.2f}%"
@@ -41,50 +65,15 @@ def safe_pct(value):
         return "N/A"
 
 
-def load_cache():
-    """Return cached data if it's recent."""
-    if not os.path.exists(CACHE_FILE):
-        return None
-    try:
-        with open(CACHE_FILE, "r") as f:
-            cache = json.load(f)
-        if time.time() - cache.get("timestamp", 0) < CACHE_TTL:
-            return pd.DataFrame(cache["data"])
-    except Exception:
-        return None
-    return None
-
-
-def save_cache(df):
-    """Save data to local cache."""
-    try:
-        with open(CACHE_FILE, "w") as f:
-            json.dump({"timestamp": time.time(), "data": df.to_dict(orient="records")}, f)
-    except Exception:
-        pass
-
-
 # =========================================================
 # 📊 FETCH LIVE DATA (with retry + caching)
 # =========================================================
-def fetch_crypto_data(force_refresh=False):
-    """Fetch live crypto data from CoinGecko, respecting rate limits and optional refresh."""
-    
-    # ✅ Force clear Streamlit cache if user clicked "Refresh Data"
-    if force_refresh:
-        try:
-            st.cache_data.clear()
-            if os.path.exists(CACHE_FILE):
-                os.remove(CACHE_FILE)
-        except Exception:
-            pass
-
-    # Try cached data first
-    cached = load_cache()
-    if cached is not None and not force_refresh:
-        print("🟡 Using cached market data (to avoid rate limit).")
-        return cached
+class MarketDataUnavailable(RuntimeError):
+    """Raised inside the cached fetch so failed attempts are never memoized."""
+
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _fetch_market_frame():
     coin_ids = [c[0] for c in COINS]
     coin_symbols = {c[0]: c[1] for c in COINS}
 
@@ -94,28 +83,18 @@ def fetch_crypto_data(force_refresh=False):
         "price_change_percentage": "1h,24h,7d,14d,30d",
     }
 
-    # Retry logic for 429 errors
-    for attempt in range(3):
-        try:
-            response = requests.get(API_URL, params=params, timeout=10)
-            if response.status_code == 429:
-                wait = 30 * (attempt + 1)
-                print(f"⚠️ Rate limit hit. Retrying in {wait}s...")
-                time.sleep(wait)
-                continue
-
-            response.raise_for_status()
-            data = response.json()
-            break
-
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Error fetching data from CoinGecko: {e}")
-            if attempt < 2:
-                time.sleep(10)
-                continue
-            return cached if cached is not None else pd.DataFrame()
-    else:
-        return cached if cached is not None else pd.DataFrame()
+    # Retries are handled by the session's adapter
+    try:
+        response = _session.get(API_URL, params=params, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Error fetching data from CoinGecko: {e}")
+        raise MarketDataUnavailable(str(e)) from e
+    if not data:
+        # An empty payload would build a column-less frame — treat it as an outage, not a result
+        print("⚠️ CoinGecko returned no market data")
+        raise MarketDataUnavailable("empty response")
 
     # Parse results
     results = []
@@ -124,24 +103,34 @@ def fetch_crypto_data(force_refresh=False):
         results.append({
             "Name": coin.get("name", "N/A"),
             "Symbol": coin_symbols.get(cid, coin.get("symbol", "N/A").upper()),
-            "Price": f"${coin.get('current_price', 0):,.2f}",
-            "📈 1h Change": safe_pct(coin.get("price_change_percentage_1h_in_currency")),
-            "📉 24h Change": safe_pct(coin.get("price_change_percentage_24h_in_currency")),
-            "📆 7d Change": safe_pct(coin.get("price_change_percentage_7d_in_currency")),
-            "📆 14d Change": safe_pct(coin.get("price_change_percentage_14d_in_currency")),
-            "📆 30d Change": safe_pct(coin.get("price_change_percentage_30d_in_currency")),
+            "price_usd": coin.get("current_price"),
+            "change_1h_pct": coin.get("price_change_percentage_1h_in_currency"),
+            "change_24h_pct": coin.get("price_change_percentage_24h_in_currency"),
+            "change_7d_pct": coin.get("price_change_percentage_7d_in_currency"),
+            "change_14d_pct": coin.get("price_change_percentage_14d_in_currency"),
+            "change_30d_pct": coin.get("price_change_percentage_30d_in_currency"),
         })
 
     df = pd.DataFrame(results)
+    numeric_cols = ["price_usd", *CHANGE_LABELS]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
     df["timestamp"] = pd.Timestamp.now()
-
-    # Save cache for next calls
-    save_cache(df)
     return df
 
 
+def fetch_crypto_data():
+    """Fetch live crypto data from CoinGecko, memoized for CACHE_TTL seconds.
+
+    Call ``st.cache_data.clear()`` to force a fresh fetch (the dashboard's Refresh button does).
+    """
+    try:
+        return _fetch_market_frame()
+    except MarketDataUnavailable:
+        return pd.DataFrame()
+
+
 # =========================================================
-# 🧠 MARKET INSIGHTS (unchanged)
+# 🧠 MARKET INSIGHTS
 # =========================================================
 def generate_insights(df):
     if df.empty:
@@ -150,48 +139,40 @@ def generate_insights(df):
     narrative = "🧠 Insight: "
     major_coins = ["Bitcoin", "Ethereum", "BNB"]
     stablecoins = ["Tether", "USDC"]
-    others = [coin for coin in df["Name"].tolist() if coin not in major_coins + stablecoins]
+    chg = df["change_24h_pct"].fillna(0)
 
     # Major coins
-    major_trends = []
-    for _, row in df.iterrows():
-        name, price, change_24h = row["Name"], row["Price"], row["📉 24h Change"]
-        try:
-            change_val = float(change_24h.replace("%", ""))
-        except:
-            change_val = 0
-        if name in major_coins:
-            if change_val < 0:
-                major_trends.append(f"{name} fell {abs(change_val):.2f}% to {price}")
-            elif change_val > 0:
-                major_trends.append(f"{name} rose {change_val:.2f}% to {price}")
-            else:
-                major_trends.append(f"{name} stayed flat at {price}")
+    majors = df.loc[df["Name"].isin(major_coins), ["Name", "price_usd"]].assign(chg=chg)
+    major_trends = [
+        f"{name} fell {abs(c):.2f}% to {safe_usd(price)}" if c < 0
+        else f"{name} rose {c:.2f}% to {safe_usd(price)}" if c > 0
+        else f"{name} stayed flat at {safe_usd(price)}"
+        for name, price, c in majors.itertuples(index=False, name=None)
+    ]
     if major_trends:
         narrative += " ".join(major_trends) + ". "
 
     # Stablecoins
-    stable_trends = [f"{r['Name']} steady at {r['Price']}" for _, r in df.iterrows() if r["Name"] in stablecoins]
+    stable = df.loc[df["Name"].isin(stablecoins), ["Name", "price_usd"]]
+    stable_trends = [f"{name} steady at {safe_usd(price)}" for name, price in stable.itertuples(index=False, name=None)]
     if stable_trends:
         narrative += " ".join(stable_trends) + ". "
 
     # Gainers and losers
-    df_clean = df[df["📉 24h Change"] != "N/A"].copy()
-    if not df_clean.empty:
-        df_clean["val24h"] = pd.to_numeric(df_clean["📉 24h Change"].str.replace("%", ""), errors="coerce")
-        gainer, loser = df_clean.loc[df_clean["val24h"].idxmax()], df_clean.loc[df_clean["val24h"].idxmin()]
-        narrative += f"Top gainer: {gainer['Name']} ({gainer['📉 24h Change']}), biggest loser: {loser['Name']} ({loser['📉 24h Change']}). "
+    if df["change_24h_pct"].notna().any():
+        gainer, loser = df.loc[df["change_24h_pct"].idxmax()], df.loc[df["change_24h_pct"].idxmin()]
+        narrative += f"Top gainer: {gainer['Name']} ({safe_pct(gainer['change_24h_pct'])}), biggest loser: {loser['Name']} ({safe_pct(loser['change_24h_pct'])}). "
 
     narrative += "Overall, the market shows moderate volatility with traders adjusting to global sentiment."
     return narrative
 
 
 # =========================================================
-# 🧪 MAIN (unchanged for manual testing)
+# 🧪 MAIN
 # =========================================================
 def main():
     print("Fetching cryptocurrency data...\n")
-    df = fetch_crypto_data(force_refresh=True)
+    df = fetch_crypto_data()
     print(df.to_string(index=False))
     print("\nMarket Insights:\n")
     print(generate_insights(df))
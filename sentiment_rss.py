@@ -1,12 +1,20 @@
 import os
+import sys
 import sqlite3
+import io
 import pandas as pd
-import feedparser
-from datetime import datetime
+import requests
+from lxml import etree
+from datetime import timezone
+from email.utils import parsedate_to_datetime
 from openai import OpenAI
 from dotenv import load_dotenv
+import streamlit as st
 import json
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # =========================================================
 # 🔧 CONFIG
@@ -19,7 +27,19 @@ DB_PATH = "crypto_data.db"
 if not OPENAI_API_KEY:
     raise ValueError("❌ OPENAI_API_KEY not found. Please check your .env file.")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# The SDK already backs off on 429s and honours Retry-After; give it one extra attempt
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=3)
+
+SENTIMENT_MODEL = "gpt-4o-mini"  # 3-class labelling: the small model is faster and cheaper
+SUMMARY_MODEL = "gpt-3.5-turbo"  # free-text summary: quality matters more than speed here
+SENTIMENT_WORKERS = 8
+SENTIMENT_BATCH = 20  # headlines are ~15 tokens each; 20 fit easily in one completion
+REQUESTS_PER_MINUTE = 60  # client-side cap shared by all sentiment threads
+
+# Latency budgets for update_sentiments: below BATCH_MIN_BUDGET_MS the caller is waiting
+INTERACTIVE_BUDGET_MS = 5_000
+BATCH_MIN_BUDGET_MS = 10_000
+BULK_BUDGET_MS = 24 * 3600 * 1000  # Batch API completion window
 
 FEEDS = [
     "https://cointelegraph.com/rss",
@@ -27,154 +47,563 @@ FEEDS = [
     "https://cryptonews.com/news/feed"
 ]
 
+# Shared session so repeated feed fetches reuse connections
+_session = requests.Session()
+
+# One connection for the whole module (WAL: readers never wait on a commit).
+# It is shared across threads, so every use goes through _db_lock.
+CONN = sqlite3.connect(DB_PATH, check_same_thread=False)
+CONN.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA busy_timeout=5000;
+
+    CREATE TABLE IF NOT EXISTS crypto_news (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        link TEXT UNIQUE,
+        published DATETIME,
+        sentiment TEXT
+    );
+    CREATE TABLE IF NOT EXISTS feed_cache (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT);
+    CREATE TABLE IF NOT EXISTS sentiment_cache (title_hash TEXT PRIMARY KEY, sentiment_json TEXT);
+    CREATE TABLE IF NOT EXISTS batch_jobs (
+        job_id TEXT PRIMARY KEY,
+        status TEXT,
+        created DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    -- Articles handed to a still-open batch job: kept out of the sync path until it closes
+    CREATE TABLE IF NOT EXISTS batch_items (news_id INTEGER PRIMARY KEY, job_id TEXT);
+""")
+_db_lock = threading.Lock()
+
+# "Needs scoring": no sentiment yet and not already paid for in an open batch job
+UNSCORED = "sentiment IS NULL AND id NOT IN (SELECT news_id FROM batch_items)"
+BATCH_DONE_STATUSES = ("collected", "failed", "expired", "cancelled")
+
+
+def _migrate_news_links():
+    """One-off for older databases whose crypto_news.link had no unique constraint.
+
+    Keeps the first row per link (carrying over its latest sentiment), then adds the
+    unique index that ``INSERT OR IGNORE`` / the dashboard's upsert rely on.
+    """
+    if CONN.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_news_link'").fetchone():
+        return
+    with CONN:
+        CONN.execute("""
+            UPDATE crypto_news
+            SET sentiment = (
+                SELECT d.sentiment FROM crypto_news d
+                WHERE d.link = crypto_news.link AND d.sentiment IS NOT NULL
+                ORDER BY d.id DESC LIMIT 1
+            )
+            WHERE id IN (SELECT MIN(id) FROM crypto_news GROUP BY link)
+              AND EXISTS (
+                SELECT 1 FROM crypto_news d
+                WHERE d.link = crypto_news.link AND d.id > crypto_news.id AND d.sentiment IS NOT NULL
+              )
+        """)
+        CONN.execute(
+            "DELETE FROM crypto_news WHERE link IS NOT NULL "
+            "AND id NOT IN (SELECT MIN(id) FROM crypto_news GROUP BY link)"
+        )
+        CONN.execute("CREATE UNIQUE INDEX idx_news_link ON crypto_news(link)")
+
+
+_migrate_news_links()
+# ✅ "Unscored, newest first" is answered from a small partial index, not a table scan
+CONN.execute(
+    "CREATE INDEX IF NOT EXISTS idx_news_null_sentiment ON crypto_news(published DESC) WHERE sentiment IS NULL"
+)
+
 # =========================================================
 # 📰 FETCH NEWS
 # =========================================================
+def _parse_date(text):
+    """RFC 822 pubDate → naive UTC datetime (None if missing or malformed)."""
+    try:
+        dt = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _fetch_feed(url, etag=None, modified=None):
+    """GET one feed, sending the stored validators so an unchanged feed answers 304.
+
+    Returns ``(body or None, etag, modified)``.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+    try:
+        response = _session.get(url, headers=headers, timeout=10)
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Error fetching feed {url}: {e}")
+        return None, etag, modified
+    if response.status_code == 304:
+        return None, etag, modified  # ✅ nothing new since the last fetch
+    if response.status_code != 200:
+        # Error pages are neither parsed nor allowed to replace the stored validators
+        print(f"⚠️ Feed {url} answered HTTP {response.status_code}")
+        return None, etag, modified
+    return response.content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+
+def iter_entries(bodies):
+    """Yield one article dict per RSS <item>, streaming each feed body with iterparse."""
+    for url, body in bodies:
+        if body is None:
+            continue
+        try:
+            for _, elem in etree.iterparse(io.BytesIO(body), tag="item", recover=True):
+                yield {
+                    "title": (elem.findtext("title") or "").strip(),
+                    "link": (elem.findtext("link") or "").strip(),
+                    "published": _parse_date(elem.findtext("pubDate")),
+                    "content": elem.findtext("description") or "",  # for sentiment analysis
+                }
+                elem.clear()  # ✅ free each item's subtree as soon as it's read
+        except etree.XMLSyntaxError as e:
+            print(f"⚠️ Error parsing feed {url}: {e}")
+
+
+@st.cache_data(ttl=600, show_spinner=False)
 def fetch_crypto_news():
-    articles = []
-    for url in FEEDS:
-        feed = feedparser.parse(url)
-        for entry in feed.entries:
-            published = getattr(entry, "published", None) or getattr(entry, "updated", None)
-            try:
-                published_dt = datetime.strptime(published, "%a, %d %b %Y %H:%M:%S %Z") if published else None
-            except Exception:
-                published_dt = None
-
-            articles.append({
-                "title": entry.get("title", "").strip(),
-                "link": entry.get("link", "").strip(),
-                "published": published_dt,
-                "content": entry.get("summary", "")  # for sentiment analysis
-            })
-
-    df = pd.DataFrame(articles).drop_duplicates(subset=["link"])
-    if df.empty:
-        return df
-
-    # ✅ Keep only latest 20 to balance speed & coverage
-    df = df.sort_values(by="published", ascending=False).head(20)
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS crypto_news (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            link TEXT UNIQUE,
-            published DATETIME,
-            sentiment TEXT
-        )
-    """)
-    for _, row in df.iterrows():
+    with _db_lock:
+        validators = {
+            url: (etag, modified)
+            for url, etag, modified in CONN.execute("SELECT url, etag, last_modified FROM feed_cache")
+        }
+
+    # ✅ Feeds are independent HTTP round-trips — fetch them concurrently
+    with ThreadPoolExecutor(max_workers=len(FEEDS)) as ex:
+        feeds = list(ex.map(lambda url: _fetch_feed(url, *validators.get(url, (None, None))), FEEDS))
+
+    # ✅ Entries stream straight from the parser into the frame (no intermediate list of dicts)
+    df = pd.DataFrame.from_records(
+        iter_entries((url, body) for url, (body, _, _) in zip(FEEDS, feeds)),
+        columns=["title", "link", "published", "content"],
+    )
+    rows = []
+    if not df.empty:
+        df = df.astype({"title": "string", "link": "string"})
+        df["published"] = pd.to_datetime(df["published"])
+
+        # ✅ Keep only latest 20 to balance speed & coverage (nlargest = partial sort, not a full one)
+        df = df.loc[~df["link"].duplicated()].nlargest(20, "published")
+        # sqlite3 can't bind pd.Timestamp — store text, NaT → NULL
+        published = df["published"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        published = published.astype(object).where(published.notna(), None)
+        rows = list(zip(df["title"].astype(object), df["link"].astype(object), published))
+
+    # ✅ One executemany in one transaction instead of a per-row iterrows loop;
+    #    validators are saved in the same commit so a failed insert is re-fetched next time
+    with _db_lock:
         try:
-            cursor.execute(
+            CONN.execute("BEGIN IMMEDIATE")
+            CONN.executemany(
                 "INSERT OR IGNORE INTO crypto_news (title, link, published) VALUES (?, ?, ?)",
-                (row["title"], row["link"], row["published"])
+                rows
             )
+            CONN.executemany(
+                "INSERT OR REPLACE INTO feed_cache (url, etag, last_modified) VALUES (?, ?, ?)",
+                [(url, etag, modified) for url, (_, etag, modified) in zip(FEEDS, feeds)],
+            )
+            CONN.commit()
         except Exception as e:
             print(f"⚠️ DB insert error: {e}")
-    conn.commit()
-
-    # ✅ Only return *new* (unprocessed) articles for sentiment analysis
-    new_articles = pd.read_sql_query(
-        "SELECT * FROM crypto_news WHERE sentiment IS NULL ORDER BY published DESC LIMIT 20",
-        conn
-    )
+            CONN.rollback()
 
-    conn.close()
-    return new_articles
+        # ✅ Only return *new* (unprocessed) articles for sentiment analysis
+        # (unchanged feeds answered 304, so earlier unscored articles come from the DB)
+        return pd.read_sql_query(
+            f"SELECT * FROM crypto_news WHERE {UNSCORED} ORDER BY published DESC LIMIT 20",
+            CONN
+        )
 
 # =========================================================
 # 🤖 SENTIMENT ANALYSIS
 # =========================================================
-def analyze_sentiment_batch(texts):
-    """Analyze up to 5 articles in one API call to speed up processing."""
-    combined_text = "\n\n".join([f"{i+1}. {t}" for i, t in enumerate(texts)])
-    prompt = f"""
-    Analyze the sentiment of the following crypto news headlines (Positive, Negative, Neutral).
-    Respond in JSON list format with one entry per headline, each containing:
-    {{ "headline": "...", "sentiment": "...", "reason": "..." }}
+class RateLimiter:
+    """Thread-safe pacing: at most ``per_minute`` acquisitions, evenly spaced."""
 
-    Headlines:
-    {combined_text}
-    """
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_limiter = RateLimiter(REQUESTS_PER_MINUTE)
+
+
+# One-letter labels keep the reply short; expanded again before storing
+SENTIMENT_LABELS = {"P": "Positive", "N": "Negative", "U": "Neutral"}
+
+
+def _sentiment_prompt(texts, summarize=False):
+    # Compact JSON array input instead of numbered prose → fewer input tokens
+    titles = json.dumps({"titles": list(texts)}, ensure_ascii=False, separators=(",", ":"))
+    summary_field = ',"summary":"<2–3 sentence market summary of all headlines>"' if summarize else ""
+    return (
+        "Classify the sentiment of each crypto news headline in `titles`: "
+        "P=Positive, N=Negative, U=Neutral.\n"
+        f'Reply with JSON only: {{"r":[{{"s":"P|N|U","w":"<reason, max 8 words>"}},...]{summary_field}}}, '
+        "one entry per headline, same order, headlines not repeated.\n"
+        f"{titles}"
+    )
+
+
+def _neutral(text, reason):
+    """Fallback result; flagged so it never lands in the sentiment cache."""
+    return {"headline": text, "sentiment": "Neutral", "reason": reason, "fallback": True}
+
+
+def _parse_sentiments(content, texts):
+    """Map the terse reply back onto the inputs by index: one full result per headline."""
     try:
+        result = json.loads(content)
+    except json.JSONDecodeError:
+        return [_neutral(t, "Invalid JSON") for t in texts]
+    entries = result.get("r") if isinstance(result, dict) else None
+    if not isinstance(entries, list):
+        # Fallback if GPT response is invalid
+        return [_neutral(t, "Parsing error") for t in texts]
+
+    sentiments = []
+    for i, text in enumerate(texts):
+        entry = entries[i] if i < len(entries) else None
+        label = SENTIMENT_LABELS.get(str(entry.get("s", "")).upper()) if isinstance(entry, dict) else None
+        if label is None:
+            # Callers match results to inputs by position — pad short or malformed replies
+            sentiments.append(_neutral(text, "No result"))
+        else:
+            sentiments.append({"headline": text, "sentiment": label, "reason": entry.get("w", "")})
+    return sentiments
+
+
+def _chat_json(prompt, max_tokens):
+    """One json_object completion, retried once with more room if the reply doesn't hold ``r``."""
+    for _ in range(2):
+        _limiter.acquire()
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+            model=SENTIMENT_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0
+            temperature=0,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},  # ✅ always parseable, even for long batches
         )
-        content = response.choices[0].message.content.strip()
+        content = (response.choices[0].message.content or "").strip()
         try:
-            result = json.loads(content)
-            if isinstance(result, list):
-                return result
-            else:
-                # Fallback if GPT response is invalid
-                return [{"headline": t, "sentiment": "Neutral", "reason": "Parsing error"} for t in texts]
-        except json.JSONDecodeError:
-            return [{"headline": t, "sentiment": "Neutral", "reason": "Invalid JSON"} for t in texts]
+            if isinstance(json.loads(content).get("r"), list):
+                return content
+        except (json.JSONDecodeError, AttributeError):
+            pass
+        max_tokens *= 2  # a cut-off reply is the usual cause of broken JSON
+    return content
+
+
+def analyze_sentiment_batch(texts):
+    """Analyze up to SENTIMENT_BATCH articles in one API call to speed up processing."""
+    try:
+        content = _chat_json(_sentiment_prompt(texts), max_tokens=40 * len(texts) + 50)
+        return _parse_sentiments(content, texts)
     except Exception as e:
         print(f"❌ GPT error: {e}")
-        return [{"headline": t, "sentiment": "Neutral", "reason": str(e)} for t in texts]
+        return [_neutral(t, str(e)) for t in texts]
+
+def analyze_and_summarize(titles):
+    """Sentiments *and* a market summary for the same headlines in one request.
+
+    Returns ``{"sentiments": [...], "summary": str}``.
+    """
+    try:
+        content = _chat_json(_sentiment_prompt(titles, summarize=True), max_tokens=40 * len(titles) + 250)
+    except Exception as e:
+        print(f"❌ GPT error: {e}")
+        return {"sentiments": [_neutral(t, str(e)) for t in titles], "summary": "⚠️ Could not generate summary."}
+
+    try:
+        summary = json.loads(content).get("summary")
+    except (json.JSONDecodeError, AttributeError):
+        summary = None
+    return {
+        "sentiments": _parse_sentiments(content, titles),
+        "summary": summary.strip() if isinstance(summary, str) and summary.strip() else "⚠️ Could not generate summary.",
+    }
 
 # ✅ Compatibility wrapper
 def analyze_sentiment(text):
     """Analyze sentiment for a single article safely."""
     result = analyze_sentiment_batch([text])
-    return result[0] if result else {"headline": text, "sentiment": "Neutral", "reason": "No result"}
+    return result[0] if result else _neutral(text, "No result")
 
 # =========================================================
 # 🧠 MULTI-THREADED SENTIMENT UPDATES
 # =========================================================
-def update_sentiments(df):
+def _title_hash(title):
+    return hashlib.sha1(title.lower().strip().encode("utf-8")).hexdigest()
+
+
+def _store_sentiments(updates, new_cache):
+    """Write one batch of results in its own transaction (WAL keeps each commit cheap)."""
+    if not updates:
+        return
+    with _db_lock:
+        try:
+            # ✅ Take the write lock up front: the batch lands in one transaction / one fsync
+            CONN.execute("BEGIN IMMEDIATE")
+            CONN.executemany("UPDATE crypto_news SET sentiment=? WHERE id=?", updates)
+            CONN.executemany("INSERT OR IGNORE INTO sentiment_cache VALUES (?, ?)", new_cache)
+            CONN.commit()
+        except Exception as e:
+            print(f"⚠️ DB update error: {e}")
+            CONN.rollback()
+
+
+def pending_articles():
+    """Every article still missing a sentiment (and not in an open batch job), newest first."""
+    with _db_lock:
+        return pd.read_sql_query(
+            f"SELECT id, title, link, published FROM crypto_news WHERE {UNSCORED} ORDER BY published DESC",
+            CONN,
+        )
+
+
+def update_sentiments(df, summarize=False, latency_budget_ms=INTERACTIVE_BUDGET_MS):
+    """Score and store sentiment for ``df``'s articles.
+
+    With ``summarize=True`` the top 10 headlines are scored by the same request that
+    writes the news summary, which is returned (otherwise returns None).
+
+    Callers that can wait (``latency_budget_ms >= BATCH_MIN_BUDGET_MS``, e.g. cron
+    backfills) with at least 5 articles are routed to the Batch API at half the cost;
+    results land when ``collect_pending_batches`` runs.
+    """
     if df.empty:
         print("✅ No new articles need sentiment updates.")
-        return
+        return None
+
+    if latency_budget_ms >= BATCH_MIN_BUDGET_MS and len(df) >= 5:
+        submit_sentiment_batch(df)
+        return generate_news_summary(df) if summarize else None
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    rows = [(row_id, title, _title_hash(title)) for row_id, title in df[["id", "title"]].values.tolist()]
+    head = rows[:10] if summarize else []
+    rows = rows[len(head):]
 
-    rows = df[["id", "title"]].values.tolist()
-    print(f"🧠 Analyzing {len(rows)} new articles in batches of 5...")
+    # ✅ Feeds republish the same headline — reuse any result already paid for
+    hashes = list({h for _, _, h in rows})
+    with _db_lock:
+        cached = dict(CONN.execute(
+            f"SELECT title_hash, sentiment_json FROM sentiment_cache WHERE title_hash IN ({','.join('?' * len(hashes))})",
+            hashes,
+        ).fetchall())
 
-    # Group rows into batches of 5
-    batches = [rows[i:i+5] for i in range(0, len(rows), 5)]
+    uncached = [(row_id, title) for row_id, title, h in rows if h not in cached]
+    hits = [(cached[h], row_id) for row_id, _, h in rows if h in cached]
+    print(f"🧠 Analyzing {len(uncached)} new articles in batches of {SENTIMENT_BATCH} ({len(hits)} cached)...")
+    _store_sentiments(hits, [])
 
-    for batch in batches:
-        texts = [title for _, title in batch]
-        sentiments = analyze_sentiment_batch(texts)
-        for (row_id, title), sentiment in zip(batch, sentiments):
-            try:
+    batches = [uncached[i:i+SENTIMENT_BATCH] for i in range(0, len(uncached), SENTIMENT_BATCH)]
+
+    # ✅ Batches run concurrently (paced by the rate limiter): wall time ≈ slowest call, not the sum
+    summary = None
+    with ThreadPoolExecutor(max_workers=max(1, min(SENTIMENT_WORKERS, len(batches) + bool(head)))) as ex:
+        futures = {ex.submit(analyze_sentiment_batch, [title for _, title in b]): b for b in batches}
+        if head:
+            # ✅ One request yields both the summary and these headlines' sentiments
+            futures[ex.submit(analyze_and_summarize, [title for _, title, _ in head])] = [
+                (row_id, title) for row_id, title, _ in head
+            ]
+        for future in as_completed(futures):
+            batch = futures[future]
+            sentiments = future.result()
+            if isinstance(sentiments, dict):
+                summary, sentiments = sentiments["summary"], sentiments["sentiments"]
+            updates, new_cache = [], []
+            for (row_id, title), sentiment in zip(batch, sentiments):
                 # ✅ Store as JSON string safely
-                cursor.execute(
-                    "UPDATE crypto_news SET sentiment=? WHERE id=?",
-                    (json.dumps(sentiment, ensure_ascii=False), row_id)
-                )
-            except Exception as e:
-                print(f"⚠️ DB update error for '{title}': {e}")
-    conn.commit()
-    conn.close()
+                sentiment_json = json.dumps(sentiment, ensure_ascii=False)
+                updates.append((sentiment_json, row_id))
+                if isinstance(sentiment, dict) and not sentiment.get("fallback"):
+                    new_cache.append((_title_hash(title), sentiment_json))
+            # ✅ Checkpoint: each paid-for batch is committed as soon as it returns,
+            #    so a crash mid-run only re-scores the batches still in flight
+            _store_sentiments(updates, new_cache)
+
     print("✅ Sentiment updates complete.")
+    return summary
+
+# =========================================================
+# 📦 OPENAI BATCH API (latency-tolerant bulk scoring, ~50% cheaper)
+# =========================================================
+def _open_batch_jobs():
+    with _db_lock:
+        return [row[0] for row in CONN.execute(
+            f"SELECT job_id FROM batch_jobs WHERE status NOT IN ({','.join('?' * len(BATCH_DONE_STATUSES))})",
+            BATCH_DONE_STATUSES,
+        )]
+
+
+def submit_sentiment_batch(df):
+    """Queue one chat request per article on the Batch API; returns the job id (or None)."""
+    if df.empty:
+        print("✅ No new articles need sentiment updates.")
+        return None
+    if _open_batch_jobs():
+        # Those articles are still NULL until collected — don't pay for them twice
+        print("⏳ A batch job is still running; not submitting another.")
+        return None
+
+    row_ids = df["id"].tolist()
+    lines = [
+        json.dumps({
+            "custom_id": f"id-{row_id}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": SENTIMENT_MODEL,
+                "messages": [{"role": "user", "content": _sentiment_prompt([title])}],
+                "temperature": 0,
+                "response_format": {"type": "json_object"},
+            },
+        }, ensure_ascii=False)
+        for row_id, title in df[["id", "title"]].itertuples(index=False, name=None)
+    ]
+    try:
+        batch_file = client.files.create(
+            file=("sentiment_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        job = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+    except Exception as e:
+        print(f"❌ Batch submit error: {e}")
+        return None
+
+    # ✅ Persist the job so a later run can collect it even after a restart
+    with _db_lock:
+        CONN.execute("INSERT INTO batch_jobs (job_id, status) VALUES (?, ?)", (job.id, job.status))
+        CONN.executemany(
+            "INSERT OR REPLACE INTO batch_items (news_id, job_id) VALUES (?, ?)",
+            [(row_id, job.id) for row_id in row_ids],
+        )
+        CONN.commit()
+    print(f"📦 Submitted {len(lines)} articles as batch job {job.id}")
+    return job.id
+
+
+def collect_sentiment_batch(job_id):
+    """Store the results of a finished batch job; returns False while it's still running."""
+    try:
+        job = client.batches.retrieve(job_id)
+    except Exception as e:
+        print(f"❌ Batch retrieve error: {e}")
+        return False
+
+    status = job.status
+    if status == "completed" and not job.output_file_id:
+        # Every request failed (only error_file_id is set): close the job so its rows are resubmitted
+        status = "failed"
+    if status != "completed":
+        with _db_lock:
+            CONN.execute("UPDATE batch_jobs SET status=? WHERE job_id=?", (status, job_id))
+            if status in BATCH_DONE_STATUSES:
+                # Closed without results: release its rows back to the normal path
+                CONN.execute("DELETE FROM batch_items WHERE job_id=?", (job_id,))
+            CONN.commit()
+        print(f"⏳ Batch job {job_id} is {status}")
+        return False
+
+    try:
+        output = client.files.content(job.output_file_id).text
+    except Exception as e:
+        print(f"❌ Batch download error: {e}")
+        return False
+    with _db_lock:
+        titles = dict(CONN.execute("SELECT id, title FROM crypto_news WHERE sentiment IS NULL"))
+
+    updates = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            row_id = int(item["custom_id"].removeprefix("id-"))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            print(f"⚠️ Skipping malformed batch line: {e}")
+            continue  # the row stays unscored and is picked up again later
+        if row_id not in titles:
+            continue  # scored by another path meanwhile — keep that result
+        body = (item.get("response") or {}).get("body") or {}
+        try:
+            content = body["choices"][0]["message"]["content"].strip()
+        except (KeyError, IndexError, TypeError):
+            content = ""
+        sentiment = _parse_sentiments(content, [titles[row_id]])[0]
+        updates.append((json.dumps(sentiment, ensure_ascii=False), row_id))
+
+    with _db_lock:
+        try:
+            CONN.execute("BEGIN IMMEDIATE")
+            CONN.executemany("UPDATE crypto_news SET sentiment=? WHERE id=? AND sentiment IS NULL", updates)
+            CONN.execute("UPDATE batch_jobs SET status='collected' WHERE job_id=?", (job_id,))
+            CONN.execute("DELETE FROM batch_items WHERE job_id=?", (job_id,))
+            CONN.commit()
+        except Exception as e:
+            print(f"⚠️ DB update error: {e}")
+            CONN.rollback()
+            return False
+    print(f"✅ Collected {len(updates)} sentiments from batch job {job_id}")
+    return True
+
+
+def collect_pending_batches():
+    """Collect every submitted job not yet stored (checkpoint recovery across runs)."""
+    for job_id in _open_batch_jobs():
+        collect_sentiment_batch(job_id)
 
 # =========================================================
 # 📝 GENERATE MARKET SUMMARY
 # =========================================================
 def generate_news_summary(df):
+    """Summary only — for callers whose sentiments are scored elsewhere (e.g. the Batch API).
+
+    When both are needed, ``update_sentiments(df, summarize=True)`` gets them in one request.
+    """
     if df.empty:
         return "⚠️ No new news to summarize."
-    
+
     titles_text = "\n".join(df["title"].head(10).tolist())
     prompt = f"""
     Summarize the following crypto news headlines into a short, concise market summary in 2–3 sentences:
     {titles_text}
     """
     try:
+        _limiter.acquire()
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+            model=SUMMARY_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
+            temperature=0.3,
+            max_tokens=200,
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
@@ -185,10 +614,13 @@ def generate_news_summary(df):
 # ✅ MAIN FUNCTION
 # =========================================================
 def main():
+    collect_pending_batches()
     df = fetch_crypto_news()
-    update_sentiments(df)
-    summary = generate_news_summary(df)
-    
+    # Resume from whatever is still unscored (including articles a crashed run left behind)
+    pending = pending_articles()
+    budget = BULK_BUDGET_MS if "--batch" in sys.argv else INTERACTIVE_BUDGET_MS
+    summary = update_sentiments(pending, summarize=True, latency_budget_ms=budget)
+
     if not df.empty:
         top_links = df[["title", "link"]].head(10)
         print(summary)
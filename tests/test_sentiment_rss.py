@@ -0,0 +1,97 @@
+import importlib
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+RSS_BODY = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Test feed</title>
+<item>
+  <title>Bitcoin climbs past resistance</title>
+  <link>https://example.com/btc</link>
+  <pubDate>Tue, 14 Oct 2025 09:30:00 +0200</pubDate>
+  <description>BTC rallies.</description>
+</item>
+<item>
+  <title>Ether slips after upgrade delay</title>
+  <link>https://example.com/eth</link>
+  <pubDate>Tue, 14 Oct 2025 08:00:00 GMT</pubDate>
+</item>
+</channel></rss>
+"""
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=RSS_BODY, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {"ETag": '"v1"'}
+
+
+@pytest.fixture
+def sentiment_rss(tmp_path, monkeypatch):
+    """Fresh import against an empty DB in tmp_path (the module opens DB_PATH at import)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    sys.modules.pop("sentiment_rss", None)
+    module = importlib.import_module("sentiment_rss")
+    module.fetch_crypto_news.clear()
+    yield module
+    module.CONN.close()
+    sys.modules.pop("sentiment_rss", None)
+
+
+def test_fetch_crypto_news_stores_canned_feed(sentiment_rss, tmp_path, monkeypatch):
+    monkeypatch.setattr(sentiment_rss, "FEEDS", ["https://example.com/rss"])
+    monkeypatch.setattr(sentiment_rss._session, "get", lambda url, **kwargs: FakeResponse())
+
+    df = sentiment_rss.fetch_crypto_news()
+
+    assert sorted(df["link"]) == [
+        "https://example.com/btc",
+        "https://example.com/eth",
+    ]
+    conn = sqlite3.connect(tmp_path / "crypto_data.db")
+    stored = dict(conn.execute("SELECT link, published FROM crypto_news"))
+    assert stored["https://example.com/btc"] == "2025-10-14 07:30:00"  # normalised to UTC
+    assert stored["https://example.com/eth"] == "2025-10-14 08:00:00"
+    assert conn.execute("SELECT etag FROM feed_cache").fetchone() == ('"v1"',)
+
+
+def test_error_response_keeps_stored_validators(sentiment_rss, monkeypatch):
+    monkeypatch.setattr(
+        sentiment_rss._session, "get",
+        lambda url, **kwargs: FakeResponse(503, b"<html>down</html>", {"ETag": '"error"'}),
+    )
+
+    assert sentiment_rss._fetch_feed("https://example.com/rss", '"v1"', None) == (None, '"v1"', None)
+
+
+def test_batch_collect_keeps_rows_scored_meanwhile(sentiment_rss, monkeypatch):
+    conn = sentiment_rss.CONN
+    conn.executemany(
+        "INSERT INTO crypto_news (id, title, link, published, sentiment) VALUES (?, ?, ?, ?, ?)",
+        [(1, "BTC up", "https://example.com/1", "2025-10-14 08:00:00", None),
+         (2, "ETH down", "https://example.com/2", "2025-10-14 07:00:00", '{"sentiment": "Negative"}')],
+    )
+    conn.execute("INSERT INTO batch_jobs (job_id, status) VALUES ('job-1', 'in_progress')")
+    conn.executemany("INSERT INTO batch_items (news_id, job_id) VALUES (?, 'job-1')", [(1,), (2,)])
+    conn.commit()
+    assert sentiment_rss.pending_articles().empty  # open job keeps its rows off the sync path
+
+    line = '{"custom_id": "id-%d", "response": {"body": {"choices": [{"message": {"content": "{\\"r\\":[{\\"s\\":\\"P\\",\\"w\\":\\"x\\"}]}"}}]}}}'
+    job = type("Job", (), {"status": "completed", "output_file_id": "file-1"})
+    monkeypatch.setattr(sentiment_rss.client.batches, "retrieve", lambda job_id: job)
+    monkeypatch.setattr(
+        sentiment_rss.client.files, "content",
+        lambda file_id: type("File", (), {"text": "\n".join(line % i for i in (1, 2))}),
+    )
+
+    assert sentiment_rss.collect_sentiment_batch("job-1")
+    rows = dict(conn.execute("SELECT id, sentiment FROM crypto_news"))
+    assert '"Positive"' in rows[1]
+    assert rows[2] == '{"sentiment": "Negative"}'
+    assert conn.execute("SELECT COUNT(*) FROM batch_items").fetchone() == (0,)